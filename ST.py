@@ -1,8 +1,14 @@
 import math
+import numpy as np
 import pandas as pd
 import streamlit as st
 from io import BytesIO
 
+from cutting import (
+    demand_arrays, reachable_lengths, scale_plans, solve_patterns,
+    solve_patterns_exact, summarize_plans, sweep_bars
+)
+
 # 设置页面配置
 st.set_page_config(
     page_title="材料裁切优化系统",
@@ -14,28 +20,25 @@ st.set_page_config(
 def read_demands_from_excel(file_content):
     """从Excel文件读取裁切需求"""
     try:
-        df = pd.read_excel(BytesIO(file_content))
+        df = pd.read_excel(BytesIO(file_content), engine='calamine')
+        df.columns = [str(col).strip() for col in df.columns]
 
         required_columns = ['长度(mm)', '数量(根)']
-        actual_columns = [col.strip() for col in df.columns]
-        if not all(req_col in actual_columns for req_col in required_columns):
+        if not all(req_col in df.columns for req_col in required_columns):
             return None, "Excel文件必须包含'长度(mm)'和'数量(根)'两列"
 
-        demands = {}
-        for _, row in df.iterrows():
-            try:
-                length = int(row['长度(mm)'])
-                quantity = int(row['数量(根)'])
-            except (ValueError, TypeError):
-                return None, f"第{_ + 2}行：长度/数量必须是整数"
+        values = df[required_columns].apply(pd.to_numeric, errors='coerce')
+        invalid = values.isna().any(axis=1)
+        if invalid.any():
+            return None, f"第{invalid.idxmax() + 2}行：长度/数量必须是整数"
 
-            if length <= 0 or quantity <= 0:
-                return None, f"第{_ + 2}行：长度和数量必须为正数"
+        values = values.astype('int64')
+        non_positive = (values <= 0).any(axis=1)
+        if non_positive.any():
+            return None, f"第{non_positive.idxmax() + 2}行：长度和数量必须为正数"
 
-            if length in demands:
-                demands[length] += quantity
-            else:
-                demands[length] = quantity
+        # 合并相同长度的需求
+        demands = values.groupby('长度(mm)', sort=False)['数量(根)'].sum().to_dict()
 
         if not demands:
             return None, "没有有效数据（至少需要1行）"
@@ -46,95 +49,117 @@ def read_demands_from_excel(file_content):
         return None, f"读取失败：{str(e)}"
 
 
-def greedy_cutting_optimization(stock_length, demands):
-    """贪心算法实现裁切优化"""
-    for length in demands:
-        if length > stock_length:
-            return None, f"需求长度 {length}mm 超过原始材料长度 {stock_length}mm"
-
-    demand_list = [{'length': length, 'quantity': qty}
-                   for length, qty in demands.items()]
-    demand_list.sort(key=lambda x: -x['length'])
-
-    cutting_plans = []
-    total_stock_used = 0
-    total_used_length = 0
-
-    while any(d['quantity'] > 0 for d in demand_list):
-        remaining_length = stock_length
-        current_pattern = {}
-
-        for demand in demand_list:
-            if demand['quantity'] <= 0 or demand['length'] > remaining_length:
-                continue
-
-            max_possible = math.floor(remaining_length / demand['length'])
-            actual_count = min(max_possible, demand['quantity'])
-
-            if actual_count > 0:
-                current_pattern[demand['length']] = actual_count
-                remaining_length -= actual_count * demand['length']
-                demand['quantity'] -= actual_count
-
-        if not current_pattern:
-            return None, "无法满足所有需求（可能尺寸不合理）"
-
-        pattern_used_length = stock_length - remaining_length
-        utilization = (pattern_used_length / stock_length) * 100
-
-        existing_idx = next(
-            (i for i, plan in enumerate(cutting_plans) if plan['pattern'] == current_pattern),
-            None
-        )
-        if existing_idx is not None:
-            cutting_plans[existing_idx]['count'] += 1
-        else:
-            cutting_plans.append({
-                'pattern': current_pattern,
-                'count': 1,
-                'utilization': utilization,
-                'waste': remaining_length
-            })
-
-        total_stock_used += 1
-        total_used_length += pattern_used_length
-
-    total_utilization = (total_used_length / (total_stock_used * stock_length)) * 100
-    total_waste = total_stock_used * stock_length - total_used_length
-
+def _format_for_display(stock_length, raw_plans):
+    """将裁切模式格式化为界面展示用的表格行，仅在需要展示时调用"""
     formatted_plans = []
-    for plan in cutting_plans:
-        pattern_desc = " + ".join([f"{count}×{length}mm"
-                                   for length, count in plan['pattern'].items()])
+    for pattern, count, used_length in raw_plans:
+        pattern_desc = " + ".join([f"{cut_count}×{length}mm"
+                                   for length, cut_count in pattern])
         formatted_plans.append({
             'pattern_desc': pattern_desc,
-            'count': plan['count'],
-            'utilization': f"{plan['utilization']:.2f}%",
-            'waste': plan['waste']
+            'count': count,
+            'utilization': f"{(used_length / stock_length) * 100:.2f}%",
+            'waste': stock_length - used_length
         })
+    return formatted_plans
 
-    return {
-        'cutting_plans': formatted_plans,
-        'total_stock_used': total_stock_used,
-        'total_utilization': f"{total_utilization:.2f}%",
-        'total_waste': total_waste
-    }, None
 
+@st.cache_data(show_spinner=False)
+def greedy_cutting_optimization(stock_length, demands_items):
+    """贪心算法实现裁切优化（demands_items 为可哈希的 (长度, 数量) 元组，便于缓存）"""
+    demands = dict(demands_items)
+    for length in demands:
+        if length > stock_length:
+            return None, f"需求长度 {length}mm 超过原始材料长度 {stock_length}mm"
+
+    # 按需求长度的最大公约数约简：切割组合总长都是 g 的倍数，原始长度向下取整到 g 的倍数不影响结果
+    lengths, quantities = demand_arrays(demands)
+    g = math.gcd(*lengths.tolist())
+    raw_plans = solve_patterns(int(stock_length) // g, tuple((lengths // g).tolist()),
+                                tuple(quantities.tolist()))
+    if raw_plans is None:
+        return None, "无法满足所有需求（可能尺寸不合理）"
+
+    return summarize_plans(stock_length, scale_plans(raw_plans, g)), None
 
-def find_optimal_stock_length(demands, min_length, max_length, step_length):
-    """寻找最佳原始材料长度"""
-    results = []
 
-    for length in range(min_length, max_length + 1, step_length):
-        demand_copy = demands.copy()
-        result, _ = greedy_cutting_optimization(length, demand_copy)
-        if result:
-            results.append({'stock_length': length, **result})
+@st.cache_data(show_spinner=False)
+def column_generation_optimization(stock_length, demands_items):
+    """列生成算法实现裁切优化（精确模式），结果附带 LP 理论下界"""
+    demands = dict(demands_items)
+    for length in demands:
+        if length > stock_length:
+            return None, f"需求长度 {length}mm 超过原始材料长度 {stock_length}mm"
 
-    if not results:
+    # 按公约数约简后，定价子问题的背包容量同样缩小 g 倍
+    lengths, quantities = demand_arrays(demands)
+    g = math.gcd(*lengths.tolist())
+    solution = solve_patterns_exact(int(stock_length) // g, lengths // g, quantities)
+    if solution is None:
+        return None, "无法满足所有需求（可能尺寸不合理）"
+
+    raw_plans, lower_bound = solution
+    result = summarize_plans(stock_length, scale_plans(raw_plans, g))
+    result['lower_bound'] = lower_bound
+    return result, None
+
+
+@st.cache_data(show_spinner=False)
+def find_optimal_stock_length(demands_items, min_length, max_length, step_length, top_n=5, batch_size=64):
+    """寻找最佳原始材料长度，返回排名前 top_n 的候选方案"""
+    demands = dict(demands_items)
+    total_demand_length = sum(length * qty for length, qty in demands.items())
+
+    # 只排序一次，数组供并行扫描使用，元组作为各次求解共享的缓存键；
+    # 长度按最大公约数 g 约简，断点与求解都在约简后的尺度上进行
+    lengths, quantities = demand_arrays(demands)
+    g = math.gcd(*lengths.tolist())
+    lengths = lengths // g
+    sorted_demands = (tuple(lengths.tolist()), tuple(quantities.tolist()))
+    reachable = reachable_lengths(lengths, quantities, max_length // g)
+
+    # 一次性得到所有可行候选长度及其对应断点（约简尺度）
+    grid = np.arange(min_length, max_length + 1, step_length, dtype=np.int64)
+    grid = grid[grid >= max(demands)]
+    effective = reachable[np.searchsorted(reachable, grid // g, side='right') - 1]
+
+    # 分支定界：用料下界为 原始长度 × ceil(需求总长 / 断点长度)，按下界由小到大分批并行求解；
+    # 一旦下界超过当前第 top_n 名的实际用料，剩余候选不可能进入前 top_n，直接跳过
+    lower_bound = grid * -(-total_demand_length // (effective * g))
+    candidates = np.argsort(lower_bound, kind='stable')
+    bars = np.zeros(grid.size, dtype=np.int64)  # 0 表示未求解
+    threshold = np.inf
+
+    for start in range(0, candidates.size, batch_size):
+        batch = candidates[start:start + batch_size]
+        batch = batch[lower_bound[batch] <= threshold]
+        if batch.size == 0:
+            break
+
+        # 同一断点只求解一次，用量再映射回各候选长度
+        unique_lengths, inverse = np.unique(effective[batch], return_inverse=True)
+        bars[batch] = sweep_bars(unique_lengths, lengths, quantities)[inverse]
+
+        solved = bars > 0
+        if np.count_nonzero(solved) >= top_n:
+            material = bars[solved] * grid[solved]
+            threshold = np.partition(material, top_n - 1)[top_n - 1]
+
+    feasible = bars > 0
+    grid, effective, bars = grid[feasible], effective[feasible], bars[feasible]
+    if grid.size == 0:
         return None, "指定范围内无可行方案"
 
-    results.sort(key=lambda x: (-float(x['total_utilization'].strip('%')), x['total_stock_used']))
+    utilization = (total_demand_length / (bars * grid)) * 100
+    order = np.lexsort((bars, -utilization))[:top_n]
+
+    # 只为入选的候选长度生成裁切模式
+    results = [
+        {'stock_length': int(grid[i]),
+         **summarize_plans(int(grid[i]),
+                            scale_plans(solve_patterns(int(effective[i]), *sorted_demands), g))}
+        for i in order
+    ]
     return results, None
 
 
@@ -179,37 +204,25 @@ def main():
                 )
     else:
         st.caption("请添加裁切需求（至少1项，长度和数量均为正整数）")
-        demand_count = st.number_input(
-            "需求数量",
-            min_value=1,
-            value=1,
-            step=1,
-            help="需要添加的裁切需求总数量"
-        )
-
-        # 动态生成输入框
-        for i in range(int(demand_count)):
-            col1, col2 = st.columns(2)
-            with col1:
-                length = st.number_input(
-                    f"需求 {i + 1} - 长度（mm）",
-                    min_value=1,
-                    value=355 if i == 0 else 200,
-                    key=f"len_{i}"
-                )
-            with col2:
-                quantity = st.number_input(
-                    f"需求 {i + 1} - 数量（根）",
-                    min_value=1,
-                    value=10 if i == 0 else 5,
-                    key=f"qty_{i}"
-                )
-
-            # 合并相同长度的需求
-            if length in demands:
-                demands[length] += quantity
-            else:
-                demands[length] = quantity
+        # 表单内的编辑仅在点击"应用需求"后才触发一次重新运行；所有需求共用一个表格控件
+        with st.form("demands_form", clear_on_submit=False):
+            edited = st.data_editor(
+                st.session_state.setdefault(
+                    "demands_df", pd.DataFrame({'长度(mm)': [355], '数量(根)': [10]})
+                ),
+                num_rows='dynamic',
+                use_container_width=True,
+                column_config={
+                    '长度(mm)': st.column_config.NumberColumn(min_value=1, step=1, required=True),
+                    '数量(根)': st.column_config.NumberColumn(min_value=1, step=1, required=True)
+                },
+                key="demands_editor"
+            )
+            st.form_submit_button("应用需求")
+
+        # 合并相同长度的需求（忽略未填写完整的行）
+        valid_rows = edited.dropna().astype('int64')
+        demands = valid_rows.groupby('长度(mm)', sort=False)['数量(根)'].sum().to_dict()
 
     # 3. 计算模式选择
     st.divider()
@@ -219,12 +232,18 @@ def main():
         ["计算指定长度的裁切方案", "寻找最佳原始材料长度（推荐）"],
         horizontal=True
     )
+    exact_mode = st.toggle(
+        "精确模式 (列生成)",
+        help="使用列生成算法求解指定长度的裁切方案，通常比贪心算法更省料，计算稍慢（仅用于指定长度模式）",
+        disabled=mode != "计算指定长度的裁切方案"
+    )
 
     # 4. 执行计算
     if st.button("开始计算", type="primary"):
         if not demands:
             st.error("请先添加裁切需求！")
             return
+        demands_items = tuple(sorted(demands.items()))
 
         if mode == "寻找最佳原始材料长度（推荐）":
             col1, col2, col3 = st.columns(3)
@@ -243,7 +262,7 @@ def main():
                 return
 
             with st.spinner(f"正在计算最佳长度（{min_length}~{max_length}mm）..."):
-                results, error = find_optimal_stock_length(demands, min_length, max_length, step_length)
+                results, error = find_optimal_stock_length(demands_items, min_length, max_length, step_length)
 
             if error:
                 st.error(f"计算失败：{error}")
@@ -256,10 +275,10 @@ def main():
                 st.success(f"### 🌟 推荐最佳长度：{best_result['stock_length']}mm")
                 st.dataframe(
                     pd.DataFrame([
-                        ["总利用率", best_result['total_utilization']],
+                        ["总利用率", f"{best_result['total_utilization']:.2f}%"],
                         ["总材料用量", f"{best_result['total_stock_used']} 根"],
                         ["总废料长度", f"{best_result['total_waste']} mm"],
-                        ["平均单根利用率", f"{float(best_result['total_utilization'].strip('%')):.2f}%"]
+                        ["平均单根利用率", f"{best_result['total_utilization']:.2f}%"]
                     ], columns=["指标", "数值"]),
                     use_container_width=True,
                     hide_index=True
@@ -269,7 +288,7 @@ def main():
                 st.subheader("📊 候选长度性能对比（前5名）")
                 top_results = results[:5]
                 candidate_data = [
-                    [i + 1, res['stock_length'], res['total_utilization'],
+                    [i + 1, res['stock_length'], f"{res['total_utilization']:.2f}%",
                      res['total_stock_used'], res['total_waste']]
                     for i, res in enumerate(top_results)
                 ]
@@ -283,14 +302,17 @@ def main():
                 # 裁切方案详情
                 st.subheader("📋 最佳长度的裁切方案详情")
                 st.dataframe(
-                    pd.DataFrame(best_result['cutting_plans']),
+                    pd.DataFrame(_format_for_display(best_result['stock_length'], best_result['raw_plans'])),
                     use_container_width=True,
                     hide_index=True
                 )
 
         else:
             with st.spinner(f"正在计算指定长度（{stock_length}mm）的方案..."):
-                result, error = greedy_cutting_optimization(stock_length, demands)
+                if exact_mode:
+                    result, error = column_generation_optimization(stock_length, demands_items)
+                else:
+                    result, error = greedy_cutting_optimization(stock_length, demands_items)
 
             if error:
                 st.error(f"计算失败：{error}")
@@ -299,14 +321,17 @@ def main():
                 st.subheader("## 计算结果：指定长度的裁切方案")
 
                 # 关键指标
+                metrics = [
+                    ["原始材料长度", f"{stock_length} mm"],
+                    ["总材料用量", f"{result['total_stock_used']} 根"],
+                    ["总利用率", f"{result['total_utilization']:.2f}%"],
+                    ["总废料长度", f"{result['total_waste']} mm"],
+                    ["方案数量", f"{len(result['raw_plans'])} 种"]
+                ]
+                if result.get('lower_bound') is not None:
+                    metrics.append(["理论最少用量（LP下界）", f"{result['lower_bound']} 根"])
                 st.dataframe(
-                    pd.DataFrame([
-                        ["原始材料长度", f"{stock_length} mm"],
-                        ["总材料用量", f"{result['total_stock_used']} 根"],
-                        ["总利用率", result['total_utilization']],
-                        ["总废料长度", f"{result['total_waste']} mm"],
-                        ["方案数量", f"{len(result['cutting_plans'])} 种"]
-                    ], columns=["指标", "数值"]),
+                    pd.DataFrame(metrics, columns=["指标", "数值"]),
                     use_container_width=True,
                     hide_index=True
                 )
@@ -314,14 +339,14 @@ def main():
                 # 裁切方案详情
                 st.subheader("📋 裁切方案详情")
                 st.dataframe(
-                    pd.DataFrame(result['cutting_plans']),
+                    pd.DataFrame(_format_for_display(stock_length, result['raw_plans'])),
                     use_container_width=True,
                     hide_index=True
                 )
 
     # 重新计算按钮（可选）
     if st.button("重新开始"):
-        st.experimental_rerun()
+        st.rerun()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,368 @@
+"""材料裁切优化的求解核心：贪心/列生成内核与候选长度扫描
+
+独立于 Streamlit 脚本成模块，脚本每次重新运行时不会被重新执行，
+numba 编译缓存与 solve_patterns 的 lru_cache 因而能跨重新运行保留。
+"""
+import functools
+import numpy as np
+from scipy.optimize import linprog
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # 未安装 numba 时退化为纯 Python 执行，长度扫描改用 joblib 多进程
+    from joblib import Parallel, delayed, effective_n_jobs
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+def demand_arrays(demands):
+    """将需求字典转换为按长度降序排列的 (长度, 数量) 两个 int64 数组"""
+    lengths = np.fromiter(demands.keys(), dtype=np.int64, count=len(demands))
+    quantities = np.fromiter(demands.values(), dtype=np.int64, count=len(demands))
+    order = np.argsort(-lengths)
+    return lengths[order], quantities[order]
+
+
+@njit("Tuple((int32[:, ::1], int64[::1], int64))(int64, int64[::1], int64[::1])", cache=True)
+def _greedy_core(stock_length, lengths, quantities):
+    """贪心裁切内核：lengths 需按降序排列，quantities 会被原地扣减
+
+    连续相同的切割模式只记录一行并累计根数，内存随模式变化次数而非使用根数增长。
+    返回 (模式矩阵, 每行对应根数, 实际使用根数)，使用根数为 -1 表示无法继续切割
+    """
+    n = lengths.shape[0]
+    remaining_pieces = quantities.sum()
+
+    # 行数不足时倍增扩容
+    patterns = np.zeros((n + 1, n), np.int32)
+    counts = np.zeros(n + 1, np.int64)
+    current = np.empty(n, np.int32)
+    rows = 0
+    bars = 0
+
+    while remaining_pieces > 0:
+        remaining = stock_length
+        cut_pieces = 0
+
+        # 无分支写法：长度超出剩余或数量已满足时 take 自然为 0
+        for j in range(n):
+            take = min(remaining // lengths[j], quantities[j])
+            current[j] = take
+            remaining -= take * lengths[j]
+            quantities[j] -= take
+            cut_pieces += take
+
+        if cut_pieces == 0:
+            return patterns[:rows].copy(), counts[:rows].copy(), -1
+        remaining_pieces -= cut_pieces
+        bars += 1
+
+        same = rows > 0
+        if same:
+            for j in range(n):
+                if patterns[rows - 1, j] != current[j]:
+                    same = False
+                    break
+        if same:
+            counts[rows - 1] += 1
+            continue
+
+        if rows == patterns.shape[0]:
+            grown_patterns = np.zeros((2 * rows, n), np.int32)
+            grown_patterns[:rows] = patterns
+            patterns = grown_patterns
+            grown_counts = np.zeros(2 * rows, np.int64)
+            grown_counts[:rows] = counts
+            counts = grown_counts
+
+        patterns[rows] = current
+        counts[rows] = 1
+        rows += 1
+
+    return patterns[:rows].copy(), counts[:rows].copy(), bars
+
+
+@njit("int64(int64, int64[::1], int64[::1])", cache=True)
+def _greedy_bars(stock_length, lengths, quantities):
+    """只计数的贪心内核：与 _greedy_core 切法相同，但不记录模式，仅返回使用根数（-1 表示无法切割）
+
+    quantities 会被原地扣减
+    """
+    n = lengths.shape[0]
+    remaining_pieces = quantities.sum()
+    bars = 0
+
+    while remaining_pieces > 0:
+        remaining = stock_length
+        cut_pieces = 0
+
+        for j in range(n):
+            take = min(remaining // lengths[j], quantities[j])
+            remaining -= take * lengths[j]
+            quantities[j] -= take
+            cut_pieces += take
+
+        if cut_pieces == 0:
+            return -1
+        remaining_pieces -= cut_pieces
+        bars += 1
+
+    return bars
+
+
+@njit("int64[::1](int64[::1], int64[::1], int64[::1])", parallel=True, cache=True)
+def _sweep_core(stock_lengths, lengths, quantities):
+    """并行计算每个候选长度所需的原材料根数（-1 表示无法切割）"""
+    k = stock_lengths.shape[0]
+    bars = np.empty(k, np.int64)
+    work = np.empty((k, quantities.shape[0]), np.int64)
+
+    for i in prange(k):
+        # 每个线程在独立的行缓冲上扣减数量；先取行视图再赋值，
+        # 避免 numba 把 work[i] = quantities 优化成直接传入 quantities
+        row = work[i]
+        row[:] = quantities
+        bars[i] = _greedy_bars(stock_lengths[i], lengths, row)
+
+    return bars
+
+
+def _count_bars_chunk(stock_lengths, lengths, quantities):
+    """计算一批候选长度所需的原材料根数，供 joblib 多进程调用
+
+    整批共用一个数量缓冲区，每个长度只做一次 np.copyto 重置。
+    """
+    qty_work = np.empty_like(quantities)
+    counts = []
+    for length in stock_lengths:
+        np.copyto(qty_work, quantities)
+        counts.append(_greedy_bars(int(length), lengths, qty_work))
+    return counts
+
+
+def sweep_bars(stock_lengths, lengths, quantities):
+    """批量计算各候选长度所需根数：优先使用 numba 并行内核，否则退化为 joblib 多进程"""
+    if NUMBA_AVAILABLE:
+        return _sweep_core(stock_lengths, lengths, quantities)
+
+    chunks = np.array_split(stock_lengths, min(effective_n_jobs(-1), max(len(stock_lengths), 1)))
+    counts = Parallel(n_jobs=-1, backend='loky')(
+        delayed(_count_bars_chunk)(chunk, lengths, quantities) for chunk in chunks
+    )
+    return np.array([count for chunk_counts in counts for count in chunk_counts], dtype=np.int64)
+
+
+@functools.lru_cache(maxsize=4096)
+def solve_patterns(stock_length, lengths_desc, quantities_desc):
+    """求解指定长度下去重后的裁切模式，按 (原始长度, 需求) 缓存
+
+    lengths_desc / quantities_desc 为调用方预先按长度降序排好的元组，这里不再排序。
+    返回 ((模式, 根数, 已用长度), ...)，无法切割时返回 None
+    """
+    lengths = np.array(lengths_desc, dtype=np.int64)
+    quantities = np.array(quantities_desc, dtype=np.int64)
+
+    patterns, counts, bars = _greedy_core(int(stock_length), lengths, quantities)
+    if bars < 0:
+        return None
+
+    return _merge_patterns(patterns, counts, lengths)
+
+
+def _pattern_signatures(patterns):
+    """为每根的切割数量向量生成去重签名
+
+    各长度的数量按位拼接成一个 int64（每个数量占 lane_bits 位），比较和哈希都只是一次整数运算；
+    拼接后超过 63 位时退化为字节串签名。
+    """
+    max_count = int(patterns.max()) if patterns.size else 0
+    lane_bits = max(max_count.bit_length(), 1)
+    if lane_bits * patterns.shape[1] > 63:
+        return [row.tobytes() for row in patterns]
+
+    shifts = np.arange(patterns.shape[1], dtype=np.int64) * lane_bits
+    return (patterns.astype(np.int64) << shifts).sum(axis=1).tolist()
+
+
+def _merge_patterns(patterns, counts, lengths):
+    """将切割数量矩阵（每行附带根数）合并去重，返回 ((模式, 根数, 已用长度), ...)"""
+    plans = []
+    pattern_index = {}
+    for row, count, signature in zip(patterns, counts.tolist(), _pattern_signatures(patterns)):
+        # 只为新出现的模式构造 (长度, 数量) 元组
+        existing_idx = pattern_index.get(signature)
+        if existing_idx is not None:
+            plans[existing_idx][1] += count
+        else:
+            pattern_index[signature] = len(plans)
+            pattern = tuple((int(lengths[j]), int(row[j])) for j in np.flatnonzero(row))
+            plans.append([pattern, count, int(row @ lengths)])
+
+    return tuple(tuple(plan) for plan in plans)
+
+
+@njit("int64[::1](int64, int64[::1], int64[::1], float64[::1])", cache=True)
+def _knapsack_core(stock_length, lengths, quantities, values):
+    """列生成的定价子问题：有界背包，在 stock_length 内使零件对偶价值之和最大
+
+    返回新模式中每种长度的切割数量
+    """
+    n = lengths.shape[0]
+
+    # 二进制拆分为 0/1 物品：item_owner 记录所属需求，item_size 记录包含的零件数
+    n_items = 0
+    for j in range(n):
+        count = min(quantities[j], stock_length // lengths[j])
+        chunk = 1
+        while count > 0:
+            count -= min(chunk, count)
+            chunk *= 2
+            n_items += 1
+
+    item_owner = np.empty(n_items, np.int64)
+    item_size = np.empty(n_items, np.int64)
+    i = 0
+    for j in range(n):
+        count = min(quantities[j], stock_length // lengths[j])
+        chunk = 1
+        while count > 0:
+            take = min(chunk, count)
+            item_owner[i] = j
+            item_size[i] = take
+            count -= take
+            chunk *= 2
+            i += 1
+
+    best = np.zeros(stock_length + 1, np.float64)
+    keep = np.zeros((n_items, stock_length + 1), np.bool_)
+    for i in range(n_items):
+        weight = lengths[item_owner[i]] * item_size[i]
+        value = values[item_owner[i]] * item_size[i]
+        for cap in range(stock_length, weight - 1, -1):
+            if best[cap - weight] + value > best[cap]:
+                best[cap] = best[cap - weight] + value
+                keep[i, cap] = True
+
+    pattern = np.zeros(n, np.int64)
+    cap = stock_length
+    for i in range(n_items - 1, -1, -1):
+        if keep[i, cap]:
+            pattern[item_owner[i]] += item_size[i]
+            cap -= lengths[item_owner[i]] * item_size[i]
+
+    return pattern
+
+
+def _column_generation(stock_length, lengths, quantities, max_iterations=200):
+    """列生成求解裁切问题的 LP 松弛
+
+    返回 (模式矩阵, 各模式用量, LP 下界)；未收敛时下界为 None，LP 求解失败时返回 None
+    """
+    n = lengths.shape[0]
+    # 初始模式：每种长度单独切满一根
+    columns = [np.zeros(n, np.int64) for _ in range(n)]
+    for j in range(n):
+        columns[j][j] = min(stock_length // lengths[j], quantities[j])
+
+    lower_bound = None
+    for _ in range(max_iterations):
+        patterns = np.array(columns)
+        res = linprog(np.ones(len(columns)), A_ub=-patterns.T, b_ub=-quantities,
+                      bounds=(0, None), method='highs')
+        if res.status != 0:
+            return None
+
+        duals = np.ascontiguousarray(-res.ineqlin.marginals, dtype=np.float64)
+        new_column = _knapsack_core(stock_length, lengths, quantities, duals)
+        # 约化成本非负：当前 LP 已最优
+        if new_column @ duals <= 1 + 1e-9:
+            lower_bound = int(np.ceil(res.fun - 1e-9))
+            break
+        columns.append(new_column)
+
+    return patterns, res.x, lower_bound
+
+
+def solve_patterns_exact(stock_length, lengths, quantities):
+    """列生成 + 取整修复：LP 解向下取整后，剩余需求由贪心内核补齐
+
+    返回 (合并后的裁切模式, LP 下界)，无法求解时返回 None
+    """
+    solution = _column_generation(stock_length, lengths, quantities)
+    if solution is None:
+        return None
+    patterns, usage, lower_bound = solution
+
+    remaining = quantities.copy()
+    rows = []
+    row_counts = []
+    for p in np.argsort(-usage):
+        for _ in range(int(np.floor(usage[p] + 1e-9))):
+            # LP 允许超额生产，按剩余需求截断，保证不多切
+            take = np.minimum(patterns[p], remaining)
+            if not take.any():
+                break
+            remaining -= take
+            # 连续相同的截断结果只记一行
+            if rows and np.array_equal(rows[-1], take):
+                row_counts[-1] += 1
+            else:
+                rows.append(take)
+                row_counts.append(1)
+
+    repair, repair_counts, bars = _greedy_core(int(stock_length), lengths, remaining)
+    if bars < 0:
+        return None
+
+    rows = np.vstack([np.array(rows, dtype=np.int64).reshape(-1, lengths.shape[0]),
+                      repair.astype(np.int64)])
+    counts = np.concatenate([np.array(row_counts, dtype=np.int64), repair_counts])
+    return _merge_patterns(rows, counts, lengths), lower_bound
+
+
+def reachable_lengths(lengths, quantities, max_length):
+    """计算不超过 max_length 的所有可组合切割总长（升序）
+
+    贪心过程中的每次判断都形如"原始长度 >= 某个切割组合总长"，
+    因此相邻两个可组合总长之间的原始长度得到的裁切模式完全相同。
+    """
+    reachable = np.zeros(max_length + 1, dtype=bool)
+    reachable[0] = True
+    for length, qty in zip(lengths.tolist(), quantities.tolist()):
+        count = min(qty, max_length // length)
+        chunk = 1
+        # 二进制拆分，将 count 个相同零件拆成 1、2、4… 组
+        while count > 0:
+            take = min(chunk, count)
+            shift = take * length
+            reachable[shift:] = reachable[shift:] | reachable[:-shift]
+            count -= take
+            chunk *= 2
+    return np.flatnonzero(reachable)
+
+
+def scale_plans(raw_plans, factor):
+    """将按公约数约简后求解得到的裁切模式还原为实际长度"""
+    return tuple(
+        (tuple((length * factor, cut_count) for length, cut_count in pattern), count, used_length * factor)
+        for pattern, count, used_length in raw_plans
+    )
+
+
+def summarize_plans(stock_length, raw_plans):
+    """汇总裁切模式在指定原始长度下的数值指标，不做字符串格式化"""
+    total_stock_used = sum(count for _, count, _ in raw_plans)
+    total_used_length = sum(count * used_length for _, count, used_length in raw_plans)
+
+    return {
+        'raw_plans': raw_plans,
+        'total_stock_used': total_stock_used,
+        'total_utilization': (total_used_length / (total_stock_used * stock_length)) * 100,
+        'total_waste': total_stock_used * stock_length - total_used_length
+    }